@@ -31,7 +31,8 @@ defaults = {
     'running': False,
     'proc': None,
     'refresh_trigger': False,
-    'initial_load_done': False
+    'initial_load_done': False,
+    'ignore_index': False
 }
 for key, value in defaults.items():
     if key not in st.session_state:
@@ -146,6 +147,12 @@ with col1:
 
     # --- Step 3: Start / Stop Prospecting ---
     st.subheader("3. Start / Stop Prospecting")
+    st.checkbox(
+        "Re-export leads found by earlier runs",
+        key="ignore_index",
+        disabled=st.session_state.running,
+        help="By default, leads already in `lead_index.db` are skipped so they are not scraped or exported twice."
+    )
     btn_col1, btn_col2 = st.columns(2) # Columns for buttons
 
     with btn_col1:
@@ -156,6 +163,8 @@ with col1:
                 st.info(f"🚀 Starting crawler for query: '{st.session_state.final_query}'...")
                 try:
                     cmd = [sys.executable, 'crawl.py', st.session_state.final_query]
+                    if st.session_state.ignore_index:
+                        cmd.append('--ignore-index')
                     env = os.environ.copy()
                     env['PYTHONIOENCODING'] = 'utf-8'
                     st.session_state.proc = subprocess.Popen(
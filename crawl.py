@@ -9,6 +9,7 @@ from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 from crawl4ai.extraction_strategy import LLMExtractionStrategy
 from pydantic import BaseModel, Field
 from typing import List, Union, Optional
+from dedup import LeadIndex, apply_to_rows, url_keys
 
 # Update this value frequently, Google changes it often.
 CSS_SELECTOR = "div.dURPMd" 
@@ -130,15 +131,12 @@ instagram_run_config = CrawlerRunConfig(
 
 # Define CSV file path and headers
 CSV_FILE = 'leads.csv'
+INSTAGRAM_FIELDS = list(InstagramSearch.model_fields) # Single source for CSV columns and lead index records
 CSV_HEADERS = [
     'google_title', 'google_url', 'google_snippet', 
-    'instagram_username', 'instagram_full_name', 'instagram_bio', 
-    'instagram_followers', 'instagram_following', 'instagram_posts_count', 
-    'instagram_website', 'instagram_email', 'instagram_phone', 
-    'instagram_location', 'instagram_category', 'instagram_profile_url'
-]
+] + [f'instagram_{field}' for field in INSTAGRAM_FIELDS]
 
-async def main(query: str): 
+async def main(query: str, ignore_index: bool = False): 
     """
     Main function to scrape Google for a query, find Instagram links, 
     scrape those profiles, and save results to CSV.
@@ -147,6 +145,17 @@ async def main(query: str):
         print("[ERROR] Query cannot be empty.")
         return
 
+    with LeadIndex(INSTAGRAM_FIELDS) as lead_index: # Closed on every exit path, including early returns
+        print(f"Opened lead index with {len(lead_index)} known leads.")
+        await scrape_leads(query, lead_index, ignore_index)
+
+async def scrape_leads(query: str, lead_index: LeadIndex, ignore_index: bool = False):
+    """
+    Scrapes Google for the query and the Instagram profiles it finds,
+    skipping and merging leads already known to the lead index.
+    With `ignore_index`, leads from earlier runs are scraped and exported again
+    (duplicates within this run are still merged, and the index is still updated).
+    """
     google_results_list: List[GoogleSearch] = []
     parsed_content = None 
 
@@ -197,7 +206,20 @@ async def main(query: str):
                      print(f"[WARNING] Skipping Google result due to validation error: {val_e}")
                      print(f"   -> Invalid item: {parsed_content}")
 
-            google_results_list = temp_google_results
+            # Skip Instagram URLs for leads we already know (from earlier runs or earlier in this list)
+            seen_url_keys = set()
+            unique_google_results = []
+            for result in temp_google_results:
+                if 'instagram.com' in result.url:
+                    keys = url_keys(result.url)
+                    known_entity = None if ignore_index else lead_index.lookup_url(result.url)
+                    if known_entity is not None or keys & seen_url_keys:
+                        print(f"[INFO] Skipping already known lead: {result.url}")
+                        continue
+                    seen_url_keys |= keys
+                unique_google_results.append(result)
+
+            google_results_list = unique_google_results
             print(f"Found {len(google_results_list)} valid potential leads from Google.")
 
             # --- Phase 1: Save Initial Google Data ---
@@ -256,6 +278,8 @@ async def main(query: str):
                  print(f"[ERROR] Failed to read {CSV_FILE} for updating: {e}")
                  return
 
+            row_for_entity = {} # Surviving lead index entity id -> DataFrame row for leads found in this run
+
             # Wrap the main scraping loop in a try-except block
             try:
                 print(f"\nStarting sequential Instagram scraping for {len(instagram_urls_to_scrape)} URLs with delays...")
@@ -339,20 +363,18 @@ async def main(query: str):
                                 if matching_indices:
                                     index_to_update = matching_indices[0] # Update the first match
 
-                                    # Update DataFrame row (use .get with default '')
-                                    leads_df.loc[index_to_update, 'instagram_username'] = insta_data.username if insta_data.username else ''
-                                    leads_df.loc[index_to_update, 'instagram_full_name'] = insta_data.full_name if insta_data.full_name else ''
-                                    leads_df.loc[index_to_update, 'instagram_bio'] = insta_data.bio if insta_data.bio else ''
-                                    leads_df.loc[index_to_update, 'instagram_followers'] = insta_data.followers if insta_data.followers else ''
-                                    leads_df.loc[index_to_update, 'instagram_following'] = insta_data.following if insta_data.following else ''
-                                    leads_df.loc[index_to_update, 'instagram_posts_count'] = insta_data.posts_count if insta_data.posts_count else ''
-                                    leads_df.loc[index_to_update, 'instagram_website'] = insta_data.website if insta_data.website else ''
-                                    leads_df.loc[index_to_update, 'instagram_email'] = insta_data.email if insta_data.email else ''
-                                    leads_df.loc[index_to_update, 'instagram_phone'] = insta_data.phone if insta_data.phone else ''
-                                    leads_df.loc[index_to_update, 'instagram_location'] = insta_data.location if insta_data.location else ''
-                                    leads_df.loc[index_to_update, 'instagram_category'] = insta_data.category if insta_data.category else ''
-                                    leads_df.loc[index_to_update, 'instagram_profile_url'] = insta_data.profile_url # Should always exist now
-                                    print(f"   -> Updated lead data in DataFrame for {original_url}")
+                                    # Merge into the existing lead if this profile duplicates one
+                                    record = insta_data.model_dump()
+                                    record['google_url'] = original_url
+                                    add_result = lead_index.add(record)
+                                    values = {f'instagram_{field}': getattr(insta_data, field) or '' for field in INSTAGRAM_FIELDS}
+                                    outcome = apply_to_rows(leads_df, row_for_entity, add_result, index_to_update, values, drop_known=not ignore_index)
+                                    if outcome == 'merged':
+                                        print(f"   -> Merged duplicate lead {original_url} into {leads_df.loc[row_for_entity[add_result.entity_id], 'google_url']}")
+                                    elif outcome == 'known':
+                                        print(f"   -> {original_url} is an already known lead, merged into lead index")
+                                    else:
+                                        print(f"   -> Updated lead data in DataFrame for {original_url}")
 
                                     # --- Progressive Save ---
                                     try:
@@ -379,6 +401,8 @@ async def main(query: str):
             except Exception as e: # Outer except block for the whole Phase 2 loop
                 print(f"[DEBUG] UNHANDLED EXCEPTION occurred during Instagram scraping loop: {type(e).__name__}: {e}")
                 print(traceback.format_exc()) # Print the full traceback
+            finally:
+                print(f"Lead index now holds {len(lead_index)} known leads.")
             # --- End Phase 2 ---
 
     print("\nScraping process finished.")
@@ -387,9 +411,10 @@ async def main(query: str):
 if __name__ == "__main__": 
     parser = argparse.ArgumentParser(description="Scrape Google for Instagram leads based on a query.")
     parser.add_argument("query", help="The search query to use on Google (e.g., 'bakery london instagram').")
+    parser.add_argument("--ignore-index", action="store_true", help="Re-scrape and re-export leads already found by earlier runs (lead_index.db).")
     args = parser.parse_args()
 
     if not os.getenv('GEMINI_API_KEY'):
         print("Error: GEMINI_API_KEY environment variable not set. Please set it before running.")
     else:
-        asyncio.run(main(args.query))
+        asyncio.run(main(args.query, args.ignore_index))
@@ -0,0 +1,468 @@
+import hashlib
+import json
+import re
+import sqlite3
+import unicodedata
+import urllib.parse
+import zlib
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Set
+
+import numpy as np
+
+# Persistent identity index, kept next to leads.csv and reused across runs.
+INDEX_FILE = 'lead_index.db'
+
+# MinHash/LSH parameters: 8 bands of 4 rows catch pairs with Jaccard ~0.6+,
+# candidates are then confirmed against MATCH_THRESHOLD on the full signature.
+NUM_PERM = 32
+LSH_BANDS = 8
+LSH_ROWS = NUM_PERM // LSH_BANDS
+MATCH_THRESHOLD = 0.7
+SHINGLE_SIZE = 3
+MIN_BIO_LENGTH = 20  # A display name alone (or a one-word bio) is too generic to fuzzy-match on
+# Exact key kinds that identify one business: a fuzzy match is rejected when these disagree.
+STRONG_KEY_KINDS = ('email', 'phone', 'site')
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, (1 << 32) - 1, size=NUM_PERM, dtype=np.uint64)
+
+# Link-in-bio and social hosts: the bare host says nothing about the lead, only its path does.
+SHARED_HOSTS = {
+    'linktr.ee', 'beacons.ai', 'linkin.bio', 'bio.link', 'lnk.bio', 'taplink.cc', 'wa.link',
+    'bit.ly', 'instagram.com', 'facebook.com', 'tiktok.com', 'youtube.com', 'sites.google.com',
+}
+# Map, search and marketplace hosts: a link there never identifies the lead on its own.
+UNKEYED_HOSTS = {
+    'google.com', 'google.com.br', 'maps.google.com', 'goo.gl', 'maps.app.goo.gl', 'g.page',
+    'g.co', 'bing.com', 'ifood.com.br', 'rappi.com.br', 'ubereats.com', 'doordash.com',
+    'mercadolivre.com.br', 'tripadvisor.com', 'tripadvisor.com.br', 'yelp.com', 'booking.com',
+}
+WHATSAPP_HOSTS = {'wa.me', 'api.whatsapp.com', 'whatsapp.com', 'web.whatsapp.com'}
+# Query parameters that only track or localize a link and never identify the lead.
+IGNORED_QUERY_PARAMS = {'hl', 'igshid', 'igsh', 'fbclid', 'gclid', 'ref', 'si'}
+# E.164 country codes are prefix-free, so the first one matching a `+` number is the only one.
+COUNTRY_CODES = {
+    '1', '7', '20', '27', '30', '31', '32', '33', '34', '36', '39', '40', '41', '43', '44',
+    '45', '46', '47', '48', '49', '51', '52', '53', '54', '55', '56', '57', '58', '60', '61',
+    '62', '63', '64', '65', '66', '81', '82', '84', '86', '90', '91', '92', '93', '94', '95',
+    '98', '212', '234', '254', '351', '352', '353', '354', '356', '357', '358', '359', '370',
+    '371', '372', '380', '385', '386', '420', '421', '591', '593', '595', '598', '966', '971',
+    '972', '974',
+}
+MIN_PHONE_DIGITS = 8
+# Instagram paths that are not profile handles.
+INSTAGRAM_RESERVED_PATHS = {
+    'p', 'reel', 'reels', 'tv', 'stories', 'explore', 'accounts', 'direct', 'about', 'legal',
+}
+
+
+# --- Key Normalization ---
+def _split_url(url: str):
+    """
+    Parses a URL (with or without scheme) into a lowercase host, path segments and query.
+    Malformed URLs (e.g. LLM output like `[cafe.com.br]`) come back with an empty host.
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parsed = urllib.parse.urlsplit(url)
+        host = (parsed.hostname or '').lower()
+    except ValueError:
+        return '', [], []
+    if host.startswith('www.'):
+        host = host[4:]
+    elif host.startswith('m.'):
+        host = host[2:]
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    query = urllib.parse.parse_qsl(parsed.query)
+    return host, segments, query
+
+def canonical_url(url: str) -> str:
+    """Drops scheme, query string (e.g. `?hl=`), fragment, `www.` and trailing slashes ('' if malformed)."""
+    host, segments, _ = _split_url(url)
+    if not host:
+        return ''
+    return '/'.join([host] + [segment.lower() for segment in segments])
+
+def normalize_handle(handle: Optional[str]) -> str:
+    if not handle:
+        return ''
+    return handle.strip().lstrip('@').lower()
+
+def handle_from_url(url: str) -> str:
+    """Returns the Instagram handle in a profile URL, or '' for posts, reels and other pages."""
+    host, segments, _ = _split_url(url)
+    if host != 'instagram.com' or not segments:
+        return ''
+    first = segments[0].lower()
+    if first in INSTAGRAM_RESERVED_PATHS:
+        return ''
+    return normalize_handle(first)
+
+def normalize_email(email: Optional[str]) -> str:
+    if not email:
+        return ''
+    email = email.strip().lower()
+    if email.startswith('mailto:'):
+        email = email[len('mailto:'):]
+    return email if '@' in email else ''
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """
+    Returns the national number as digits: the country code is stripped only when the number
+    is written internationally (`+` or `00`) with a known code, and a leading trunk `0` is dropped.
+    """
+    if not phone:
+        return ''
+    phone = phone.strip()
+    digits = re.sub(r'\D', '', phone)
+    if phone.startswith('+') or digits.startswith('00'):
+        digits = digits.lstrip('0') if digits.startswith('00') else digits
+        for length in (1, 2, 3):
+            if digits[:length] in COUNTRY_CODES:
+                digits = digits[length:]
+                break
+    if digits.startswith('0'):
+        digits = digits[1:]
+    if len(digits) < MIN_PHONE_DIGITS:
+        return ''
+    return digits
+
+def website_keys(website: Optional[str]) -> Set[str]:
+    """
+    Exact keys for a bio link: the bare domain for a site's home page, host + full path
+    (and identifying query) otherwise, and a `phone:` key for WhatsApp links.
+    """
+    keys = set()
+    if not website:
+        return keys
+    host, segments, query = _split_url(website)
+    if not host or host in UNKEYED_HOSTS:
+        return keys
+    if host in WHATSAPP_HOSTS:
+        number = dict(query).get('phone') or (segments[0] if host == 'wa.me' and segments else '')
+        phone = normalize_phone('+' + number.lstrip('+')) if re.fullmatch(r'\+?\d+', number) else ''
+        if phone:
+            keys.add('phone:' + phone)
+        return keys
+    query = sorted(
+        (name.lower(), value) for name, value in query
+        if name.lower() not in IGNORED_QUERY_PARAMS and not name.lower().startswith('utm_')
+    )
+    if not segments and not query:
+        if host not in SHARED_HOSTS:
+            keys.add('site:' + host)
+        return keys
+    site = '/'.join([host] + [segment.lower() for segment in segments])
+    if query:
+        site += '?' + urllib.parse.urlencode(query)
+    keys.add('site:' + site)
+    return keys
+
+def url_keys(url: Optional[str]) -> Set[str]:
+    """Exact keys that can be derived from a URL before it is scraped."""
+    keys = set()
+    canonical = canonical_url(url) if url else ''
+    if not canonical:
+        return keys
+    keys.add('url:' + canonical)
+    handle = handle_from_url(url)
+    if handle:
+        keys.add('handle:' + handle)
+    return keys
+
+def record_keys(record: dict) -> Set[str]:
+    """Exact identity keys (handle, email, phone, website, URLs) for an extracted lead."""
+    keys = set()
+    handle = normalize_handle(record.get('username'))
+    if handle:
+        keys.add('handle:' + handle)
+    email = normalize_email(record.get('email'))
+    if email:
+        keys.add('email:' + email)
+    phone = normalize_phone(record.get('phone'))
+    if phone:
+        keys.add('phone:' + phone)
+    keys |= website_keys(record.get('website'))
+    for url_field in ('profile_url', 'google_url'):
+        keys |= url_keys(record.get(url_field))
+    return keys
+
+
+# --- MinHash ---
+def _normalize_text(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.findall(r'\w+', text))
+
+def _shingles(text: str) -> Set[str]:
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def name_similarity(name: Optional[str], other: Optional[str]) -> float:
+    """Exact Jaccard similarity of two display names' shingles (1.0 if either is missing)."""
+    name, other = _normalize_text(name or ''), _normalize_text(other or '')
+    if not name or not other:
+        return 1.0
+    shingles, other_shingles = _shingles(name), _shingles(other)
+    if not shingles or not other_shingles:
+        return 1.0 if name == other else 0.0
+    return len(shingles & other_shingles) / len(shingles | other_shingles)
+
+def minhash_signature(record: dict) -> Optional[np.ndarray]:
+    """MinHash signature over character shingles of `full_name` and `bio`, or None without a real bio."""
+    if len(_normalize_text(record.get('bio') or '')) < MIN_BIO_LENGTH:
+        return None
+    text = _normalize_text(' '.join(filter(None, [record.get('full_name'), record.get('bio')])))
+    shingles = _shingles(text)
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+def _band_keys(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit bucket id per LSH band (collisions only add candidates, never matches)."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(
+                bytes([band]) + signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(), digest_size=8
+            ).digest(),
+            'big', signed=True,
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    parent INTEGER,  -- Entity this one was merged into, NULL for live entities
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entities_parent ON entities (parent);
+CREATE TABLE IF NOT EXISTS keys (
+    key TEXT PRIMARY KEY,
+    entity_id INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS keys_entity ON keys (entity_id);
+CREATE TABLE IF NOT EXISTS signatures (
+    id INTEGER PRIMARY KEY,
+    entity_id INTEGER NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    signature_id INTEGER NOT NULL,
+    PRIMARY KEY (band, signature_id)
+) WITHOUT ROWID;
+"""
+
+
+class AddResult(NamedTuple):
+    entity_id: int  # Surviving entity for the record
+    was_known: bool  # The record matched an entity already in the index
+    merged_ids: List[int]  # Previously separate entities merged into entity_id by this record
+
+
+class LeadIndex:
+    """
+    Identity index over leads: exact keys plus MinHash/LSH over name and bio.
+    Stored in sqlite with indexed key and band tables, so opening it is free and every
+    lookup or insert only touches the rows for the record being checked. Merged entities
+    point straight at the surviving one through the `parent` column.
+    `fields` are the lead fields stored per entity (the extraction schema's fields).
+    """
+
+    def __init__(self, fields: Sequence[str], path: str = INDEX_FILE):
+        self.fields = list(fields)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM entities WHERE parent IS NULL').fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> 'LeadIndex':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Lookups ---
+    def _find(self, entity_id: int) -> int:
+        parent = self._conn.execute('SELECT parent FROM entities WHERE id = ?', (entity_id,)).fetchone()[0]
+        return entity_id if parent is None else parent
+
+    def _match_keys(self, keys: Iterable[str]) -> List[int]:
+        keys = list(keys)
+        if not keys:
+            return []
+        rows = self._conn.execute(
+            f"SELECT entity_id FROM keys WHERE key IN ({','.join('?' * len(keys))})", keys
+        ).fetchall()
+        return sorted({self._find(entity_id) for (entity_id,) in rows})
+
+    def _entity_keys(self, entity_id: int) -> Set[str]:
+        """Exact keys of a live entity, including those of entities merged into it."""
+        rows = self._conn.execute(
+            'SELECT key FROM keys WHERE entity_id IN (SELECT id FROM entities WHERE id = ? OR parent = ?)',
+            (entity_id, entity_id),
+        ).fetchall()
+        return {key for (key,) in rows}
+
+    def _conflicts(self, keys: Set[str], entity_id: int) -> bool:
+        """True if the entity has a different email, phone or website than `keys`."""
+        entity_keys = self._entity_keys(entity_id)
+        for kind in STRONG_KEY_KINDS:
+            ours = {key for key in keys if key.startswith(kind + ':')}
+            theirs = {key for key in entity_keys if key.startswith(kind + ':')}
+            if ours and theirs and not ours & theirs:
+                return True
+        return False
+
+    def _match_signature(self, signature: Optional[np.ndarray], record: dict, keys: Set[str]) -> List[int]:
+        """
+        The entity whose name/bio signature is close to `signature`, as a list of at most one id.
+        A candidate is only accepted when its display name is also close and none of its strong
+        keys contradict `keys`; several accepted candidates are ambiguous and match nothing, so a
+        fuzzy match never bridges entities that the exact keys keep apart.
+        """
+        if signature is None:
+            return []
+        bands = _band_keys(signature)
+        rows = self._conn.execute(
+            f"""SELECT DISTINCT s.entity_id, s.signature FROM bands b JOIN signatures s ON s.id = b.signature_id
+                WHERE b.band IN ({','.join('?' * len(bands))})""",
+            bands,
+        ).fetchall()
+        candidates = set()
+        for entity_id, blob in rows:
+            similarity = np.count_nonzero(np.frombuffer(blob, dtype=np.uint32) == signature) / NUM_PERM
+            if similarity >= MATCH_THRESHOLD:
+                candidates.add(self._find(entity_id))
+        accepted = [
+            candidate for candidate in candidates
+            if name_similarity(record.get('full_name'), self.get(candidate).get('full_name')) >= MATCH_THRESHOLD
+            and not self._conflicts(keys, candidate)
+        ]
+        return accepted if len(accepted) == 1 else []
+
+    def lookup_url(self, url: str) -> Optional[int]:
+        """Returns the known entity for a URL (by canonical URL or profile handle), if any."""
+        matches = self._match_keys(url_keys(url))
+        return matches[0] if matches else None
+
+    def match(self, record: dict) -> Optional[int]:
+        """Returns the entity an extracted record duplicates, trying exact keys before MinHash."""
+        keys = record_keys(record)
+        matches = self._match_keys(keys) or self._match_signature(minhash_signature(record), record, keys)
+        return matches[0] if matches else None
+
+    def resolve(self, entity_id: int) -> int:
+        """Returns the id an entity was merged into (or the id itself)."""
+        return self._find(entity_id)
+
+    def get(self, entity_id: int) -> dict:
+        row = self._conn.execute('SELECT record FROM entities WHERE id = ?', (self._find(entity_id),)).fetchone()
+        return json.loads(row[0])
+
+    # --- Inserts / Merges ---
+    def _add_signature(self, entity_id: int, signature: np.ndarray):
+        signature_id = self._conn.execute(
+            'INSERT INTO signatures (entity_id, signature) VALUES (?, ?)', (entity_id, signature.tobytes())
+        ).lastrowid
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO bands (band, signature_id) VALUES (?, ?)',
+            [(band, signature_id) for band in _band_keys(signature)],
+        )
+
+    def _merge_record(self, target: dict, source: dict):
+        """Fills empty fields of `target` from `source` and unions their URLs."""
+        for field in self.fields:
+            if not target.get(field) and source.get(field):
+                target[field] = source[field]
+        urls = target.setdefault('urls', [])
+        for url in source.get('urls', []) + [source.get('profile_url'), source.get('google_url')]:
+            if url and url not in urls:
+                urls.append(url)
+
+    def add(self, record: dict) -> AddResult:
+        """
+        Inserts an extracted lead, or merges it into the entity it duplicates, in one transaction.
+        If the record links several known entities (e.g. same email, different handle),
+        they are merged into the oldest one.
+        """
+        keys = record_keys(record)
+        signature = minhash_signature(record)
+        new_record = {field: record.get(field) or '' for field in self.fields}
+        self._merge_record(new_record, record)
+
+        with self._conn:
+            fuzzy_matches = self._match_signature(signature, record, keys)
+            matches = self._match_keys(keys) or fuzzy_matches
+            if matches:
+                entity_id, merged_ids = matches[0], matches[1:]
+                merged_record = self.get(entity_id)
+                for other_id in merged_ids:
+                    self._merge_record(merged_record, self.get(other_id))
+                    # Repoint everything merged into other_id too, so parent chains never grow past one hop
+                    self._conn.execute(
+                        'UPDATE entities SET parent = ? WHERE id = ? OR parent = ?', (entity_id, other_id, other_id)
+                    )
+                self._merge_record(merged_record, new_record)
+                self._conn.execute(
+                    'UPDATE entities SET record = ? WHERE id = ?',
+                    (json.dumps(merged_record, ensure_ascii=False), entity_id),
+                )
+            else:
+                merged_ids = []
+                entity_id = self._conn.execute(
+                    'INSERT INTO entities (record) VALUES (?)', (json.dumps(new_record, ensure_ascii=False),)
+                ).lastrowid
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO keys (key, entity_id) VALUES (?, ?)', [(key, entity_id) for key in keys]
+            )
+            # Only keep signatures that add a new name/bio variant for this entity.
+            if signature is not None and entity_id not in {self._find(match) for match in fuzzy_matches}:
+                self._add_signature(entity_id, signature)
+        return AddResult(entity_id, bool(matches), merged_ids)
+
+
+def apply_to_rows(leads_df, row_for_entity: dict, result: AddResult, row_index, values: dict,
+                  drop_known: bool = True) -> str:
+    """
+    Applies a lead just added to the index to this run's export DataFrame.
+    `row_for_entity` maps surviving entity ids to the row holding that lead in this run and is
+    updated in place; `values` maps `leads_df` columns to the lead's values for `row_index`.
+    Returns 'merged' (blanks of an earlier row from this run filled, `row_index` dropped),
+    'known' (lead exported by an earlier run, `row_index` dropped unless `drop_known` is False)
+    or 'updated'.
+    """
+    for merged_id in result.merged_ids:  # Keep rows keyed by the surviving entity
+        if merged_id in row_for_entity:
+            row_for_entity.setdefault(result.entity_id, row_for_entity.pop(merged_id))
+    target_index = row_for_entity.get(result.entity_id)
+
+    if target_index is not None and target_index != row_index:
+        for column, value in values.items():
+            if not leads_df.loc[target_index, column] and value:
+                leads_df.loc[target_index, column] = value
+        leads_df.drop(index=row_index, inplace=True)
+        return 'merged'
+    if drop_known and result.was_known and target_index is None:
+        leads_df.drop(index=row_index, inplace=True)
+        return 'known'
+    row_for_entity[result.entity_id] = row_index
+    for column, value in values.items():
+        leads_df.loc[row_index, column] = value
+    return 'updated'
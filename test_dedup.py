@@ -0,0 +1,196 @@
+import pandas as pd
+import pytest
+
+from dedup import AddResult, LeadIndex, apply_to_rows, normalize_phone, url_keys, website_keys
+
+# Mirrors crawl.InstagramSearch, which can't be imported without crawl4ai
+FIELDS = [
+    'username', 'full_name', 'bio', 'followers', 'following', 'posts_count',
+    'website', 'email', 'phone', 'location', 'category', 'profile_url',
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    lead_index = LeadIndex(FIELDS, str(tmp_path / 'lead_index.db'))
+    yield lead_index
+    lead_index.close()
+
+
+# --- website_keys ---
+def test_website_keys_bare_domain_for_home_page():
+    assert website_keys('https://www.cafe.com.br/') == {'site:cafe.com.br'}
+
+def test_website_keys_full_path_without_tracking_params():
+    assert website_keys('https://cafe.com.br/menu?utm_source=ig') == {'site:cafe.com.br/menu'}
+    assert website_keys('sites.google.com/view/cafe-a') != website_keys('sites.google.com/view/cafe-b')
+    assert website_keys('wa.link/abc') != website_keys('wa.link/xyz')
+
+def test_website_keys_keeps_identifying_query():
+    assert website_keys('facebook.com/profile.php?id=123') != website_keys('facebook.com/profile.php?id=456')
+
+def test_website_keys_whatsapp_links_become_phone_keys():
+    assert website_keys('https://api.whatsapp.com/send?phone=5511912345678&text=oi') == {'phone:11912345678'}
+    assert website_keys('https://wa.me/5521912345678') == {'phone:21912345678'}
+    assert website_keys('https://wa.me/message/ABC123') == set()
+
+def test_website_keys_skips_map_and_marketplace_hosts():
+    assert website_keys('https://www.google.com/maps/place/Cafe') == set()
+    assert website_keys('https://www.ifood.com.br/delivery/sao-paulo-sp/cafe') == set()
+    assert website_keys('https://linktr.ee') == set()
+
+
+# --- normalize_phone ---
+def test_normalize_phone_keeps_area_code_of_11_digit_numbers():
+    assert normalize_phone('+55 11 91234-5678') == '11912345678'
+    assert normalize_phone('+55 21 91234-5678') == '21912345678'
+    assert normalize_phone('(31) 91234-5678') == '31912345678'
+
+def test_normalize_phone_international_and_national_forms_match():
+    assert normalize_phone('(11) 91234-5678') == normalize_phone('+55 11 91234-5678')
+    assert normalize_phone('0055 11 91234-5678') == normalize_phone('011 91234-5678')
+    assert normalize_phone('+44 (0)20 7946 0958') == '2079460958'
+
+def test_normalize_phone_rejects_short_numbers():
+    assert normalize_phone('12345') == ''
+
+
+# --- url_keys ---
+def test_url_keys_ignore_query_and_trailing_slash():
+    assert url_keys('https://www.instagram.com/cafedamata/?hl=pt') == url_keys('https://instagram.com/cafedamata')
+    assert 'handle:cafedamata' in url_keys('https://instagram.com/CafeDaMata/')
+
+def test_url_keys_post_links_have_no_handle():
+    assert url_keys('https://www.instagram.com/p/Cx1abc/') == {'url:instagram.com/p/cx1abc'}
+
+def test_malformed_urls_yield_no_keys():
+    assert website_keys('[cafe.com.br]') == set()
+    assert url_keys('http://[abc') == set()
+
+
+# --- LeadIndex ---
+def test_add_merges_records_sharing_a_key(index):
+    first = index.add({'username': '@cafedamata', 'bio': '', 'profile_url': 'https://instagram.com/cafedamata'})
+    second = index.add({'username': 'CafeDaMata', 'email': 'oi@cafe.com'})
+    assert not first.was_known
+    assert second.was_known and second.entity_id == first.entity_id
+    assert index.get(first.entity_id)['email'] == 'oi@cafe.com'
+    assert len(index) == 1
+
+def test_add_matches_near_duplicate_name_and_bio(index):
+    first = index.add({
+        'username': 'cafedamatasjc', 'full_name': 'Café da Mata',
+        'bio': 'Melhor cafeteria da região, estacionamento gratuito',
+    })
+    second = index.add({
+        'username': 'cafedamata.oficial', 'full_name': 'Cafe da Mata',
+        'bio': 'Melhor cafeteria da regiao, estacionamento gratuito!',
+    })
+    assert second.was_known and second.entity_id == first.entity_id
+
+def test_add_keeps_same_name_with_different_phones_apart(index):
+    bio = 'A melhor pizza napolitana da cidade, forno a lenha'
+    first = index.add({'username': 'pizzariabella_sp', 'full_name': 'Pizzaria Bella', 'bio': bio, 'phone': '(11) 3333-4444'})
+    second = index.add({'username': 'pizzariabella_rj', 'full_name': 'Pizzaria Bella', 'bio': bio, 'phone': '(21) 2222-5555'})
+    assert not second.was_known and second.entity_id != first.entity_id
+
+def test_add_does_not_fuzzy_match_on_display_name_alone(index):
+    first = index.add({'username': 'pizzariabella_sp', 'full_name': 'Pizzaria Bella'})
+    second = index.add({'username': 'pizzariabella_rj', 'full_name': 'Pizzaria Bella'})
+    assert not second.was_known and second.entity_id != first.entity_id
+
+def test_add_keeps_different_names_with_generic_bio_apart(index):
+    bio = 'Dentista em São Paulo. Clareamento, implantes e ortodontia. Agende sua consulta!'
+    first = index.add({'username': 'draanasouza', 'full_name': 'Dra. Ana Souza', 'bio': bio})
+    second = index.add({'username': 'draanalima', 'full_name': 'Dra. Ana Lima', 'bio': bio})
+    assert not second.was_known and second.entity_id != first.entity_id
+
+def test_add_does_not_bridge_conflicting_entities_by_fuzzy_match(index):
+    bio = 'A melhor pizza napolitana da cidade, forno a lenha'
+    first = index.add({'username': 'bella_sp', 'full_name': 'Pizzaria Bella', 'bio': bio, 'phone': '(11) 3333-4444'})
+    second = index.add({'username': 'bella_rj', 'full_name': 'Pizzaria Bella', 'bio': bio, 'phone': '(21) 2222-5555'})
+    third = index.add({'username': 'bella', 'full_name': 'Pizzaria Bella', 'bio': bio})
+    assert not third.was_known and third.merged_ids == []
+    assert index.resolve(second.entity_id) != index.resolve(first.entity_id)
+
+def test_add_keeps_different_whatsapp_numbers_apart(index):
+    first = index.add({'username': 'a', 'website': 'https://api.whatsapp.com/send?phone=5511912345678'})
+    second = index.add({'username': 'b', 'website': 'https://api.whatsapp.com/send?phone=5521912345678'})
+    assert not second.was_known and second.entity_id != first.entity_id
+
+def test_add_merges_entities_linked_by_a_new_record(index):
+    first = index.add({'username': 'a', 'email': 'a@cafe.com'})
+    second = index.add({'username': 'b', 'phone': '+55 11 91234-5678'})
+    linked = index.add({'username': 'c', 'email': 'a@cafe.com', 'phone': '(11) 91234-5678'})
+    assert linked.entity_id == first.entity_id
+    assert linked.merged_ids == [second.entity_id]
+    assert index.resolve(second.entity_id) == first.entity_id
+    assert len(index) == 1
+
+def test_add_accepts_malformed_website(index):
+    result = index.add({'username': 'cafedamata', 'website': '[cafe.com.br]'})
+    assert not result.was_known
+    assert index.get(result.entity_id)['website'] == '[cafe.com.br]'
+
+def test_index_persists_across_reopen(tmp_path):
+    path = str(tmp_path / 'lead_index.db')
+    lead_index = LeadIndex(FIELDS, path)
+    entity_id = lead_index.add({'username': 'cafedamata', 'profile_url': 'https://instagram.com/cafedamata/'}).entity_id
+    lead_index.close()
+
+    with LeadIndex(FIELDS, path) as reopened:
+        assert reopened.lookup_url('https://www.instagram.com/cafedamata?hl=en') == entity_id
+        assert reopened.get(entity_id)['username'] == 'cafedamata'
+
+
+# --- apply_to_rows ---
+@pytest.fixture
+def leads_df():
+    return pd.DataFrame({
+        'google_url': ['https://instagram.com/a', 'https://instagram.com/b', 'https://instagram.com/c'],
+        'instagram_username': ['', '', ''],
+        'instagram_email': ['', '', ''],
+    })
+
+def test_apply_to_rows_updates_new_lead(leads_df):
+    row_for_entity = {}
+    outcome = apply_to_rows(leads_df, row_for_entity, AddResult(1, False, []), 0, {'instagram_username': 'a', 'instagram_email': ''})
+    assert outcome == 'updated'
+    assert row_for_entity == {1: 0}
+    assert leads_df.loc[0, 'instagram_username'] == 'a'
+
+def test_apply_to_rows_fills_blanks_of_earlier_row_and_drops_duplicate(leads_df):
+    row_for_entity = {}
+    apply_to_rows(leads_df, row_for_entity, AddResult(1, False, []), 0, {'instagram_username': 'a', 'instagram_email': ''})
+    outcome = apply_to_rows(leads_df, row_for_entity, AddResult(1, True, []), 1, {'instagram_username': 'a2', 'instagram_email': 'a@cafe.com'})
+    assert outcome == 'merged'
+    assert list(leads_df.index) == [0, 2]
+    assert leads_df.loc[0, 'instagram_username'] == 'a'
+    assert leads_df.loc[0, 'instagram_email'] == 'a@cafe.com'
+
+def test_apply_to_rows_drops_lead_known_from_earlier_run(leads_df):
+    row_for_entity = {}
+    outcome = apply_to_rows(leads_df, row_for_entity, AddResult(7, True, []), 1, {'instagram_username': 'b', 'instagram_email': ''})
+    assert outcome == 'known'
+    assert list(leads_df.index) == [0, 2]
+    assert row_for_entity == {}
+
+def test_apply_to_rows_keeps_known_lead_when_not_dropping(leads_df):
+    row_for_entity = {}
+    outcome = apply_to_rows(
+        leads_df, row_for_entity, AddResult(7, True, []), 1, {'instagram_username': 'b', 'instagram_email': ''},
+        drop_known=False,
+    )
+    assert outcome == 'updated'
+    assert row_for_entity == {7: 1}
+    assert leads_df.loc[1, 'instagram_username'] == 'b'
+
+def test_apply_to_rows_rekeys_rows_of_merged_entities(leads_df):
+    row_for_entity = {}
+    apply_to_rows(leads_df, row_for_entity, AddResult(2, False, []), 0, {'instagram_username': 'a', 'instagram_email': ''})
+    # Row 1's lead links entity 2 into the older entity 1, which has no row in this run
+    outcome = apply_to_rows(leads_df, row_for_entity, AddResult(1, True, [2]), 1, {'instagram_username': 'b', 'instagram_email': 'b@cafe.com'})
+    assert outcome == 'merged'
+    assert row_for_entity == {1: 0}
+    assert list(leads_df.index) == [0, 2]
+    assert leads_df.loc[0, 'instagram_email'] == 'b@cafe.com'